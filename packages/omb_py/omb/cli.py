@@ -1,9 +1,10 @@
 from __future__ import annotations
-import argparse, os, json
+import argparse, os, json, sys, time, sqlite3
+from pydantic import ValidationError
 from .signing import Ed25519Signer, b64u_decode
-from .meter import JSONLMeter, UsageIn, meter_for_env
-from .export import bundle_for
-from .verify import verify_bundle, verify_sur
+from .meter import BatchPersistError, JSONLMeter, UsageIn, meter_for_env, rebalance_shards
+from .export import bundle_for, export_all
+from .verify import verify_bundle, verify_manifest, verify_sur
 
 # --- CLI helpers ---
 
@@ -31,16 +32,122 @@ def cmd_export(args):
     bundle = bundle_for(recs, args.tenant, signer)
     print(json.dumps(bundle, indent=2))
 
+def _positive_int(value):
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be >= 1, got {n}")
+    return n
+
+def _batches(lines, size):
+    batch = []
+    for lineno, line in enumerate(lines, 1):
+        batch.append((lineno, line))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def cmd_ingest(args):
+    signer = _signer_from_env()
+    meter = meter_for_env(signer)
+    src = sys.stdin if args.path in (None, '-') else open(args.path, 'r', encoding='utf-8')
+    stats = {"lines": 0, "recorded": 0, "errors": 0, "invalid_json": 0, "invalid_usage": 0, "last_committed_line": 0}
+    error_samples = []
+    persist_error = None
+
+    def _reject(kind, lineno, msg):
+        stats[kind] += 1
+        if len(error_samples) < args.max_error_samples:
+            error_samples.append({"line": lineno, "error": msg})
+
+    started = time.perf_counter()
+    try:
+        for batch in _batches(src, args.batch_size):
+            usages = []
+            linenos = []
+            for lineno, line in batch:
+                line = line.strip()
+                if not line:
+                    continue
+                stats["lines"] += 1
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError as e:
+                    _reject("invalid_json", lineno, f"invalid json: {e}")
+                    continue
+                if not isinstance(data, dict):
+                    _reject("invalid_usage", lineno, "not a JSON object")
+                    continue
+                try:
+                    usages.append(UsageIn(**data))
+                    linenos.append(lineno)
+                except ValidationError as e:
+                    err = e.errors(include_url=False)[0]
+                    _reject("invalid_usage", lineno, f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}")
+            try:
+                surs = meter.record_many(usages, workers=args.workers)
+            except (BatchPersistError, OSError, sqlite3.Error) as e:
+                # stop; resume with uncommitted_lines plus everything after last_line
+                committed = e.committed_index if isinstance(e, BatchPersistError) else []
+                surs = e.committed if isinstance(e, BatchPersistError) else []
+                done = set(committed)
+                persist_error = {
+                    "first_line": batch[0][0],
+                    "last_line": batch[-1][0],
+                    "uncommitted_lines": [n for k, n in enumerate(linenos) if k not in done],
+                    "error": str(e),
+                }
+            stats["recorded"] += len(surs)
+            if args.output == 'surs':
+                sys.stdout.write(''.join(json.dumps(sur.model_dump(), separators=(',', ':')) + '\n' for sur in surs))
+            if persist_error:
+                break
+            stats["last_committed_line"] = batch[-1][0]
+    finally:
+        if src is not sys.stdin:
+            src.close()
+    elapsed = time.perf_counter() - started
+    stats["errors"] = stats["invalid_json"] + stats["invalid_usage"]
+    summary = stats | {
+        "seconds": round(elapsed, 3),
+        "records_per_second": round(stats["recorded"] / elapsed, 1) if elapsed > 0 else None,
+        "error_samples": error_samples,
+        "persist_error": persist_error,
+    }
+    # keep stdout pure NDJSON when streaming SURs
+    out = sys.stderr if args.output == 'surs' else sys.stdout
+    print(json.dumps(summary, indent=2), file=out, flush=True)
+    if persist_error:
+        raise SystemExit(1)
+
+def cmd_export_all(args):
+    signer = _signer_from_env()
+    meter = meter_for_env(signer)
+    manifest = export_all(meter, signer, args.out, args.since, args.until, workers=args.workers)
+    print(json.dumps(manifest, indent=2))
+
 def cmd_verify(args):
     with open(args.path, 'r', encoding='utf-8') as f:
         data = json.load(f)
     if 'records' in data:
         ok = verify_bundle(data)
+    elif 'bundles' in data:
+        ok = verify_manifest(data, base_dir=os.path.dirname(os.path.abspath(args.path)))
     else:
         ok = verify_sur(data)
     print("OK" if ok else "FAIL")
     raise SystemExit(0 if ok else 1)
 
+def cmd_rebalance(args):
+    path = args.path or os.getenv("OMB_SQLITE_PATH", "usage.sqlite")
+    try:
+        moved = rebalance_shards(path, args.old_shards, args.new_shards)
+    except ValueError as e:
+        print(f"rebalance: {e}", flush=True)
+        raise SystemExit(1)
+    print(json.dumps({"path": path, "from": args.old_shards, "to": args.new_shards, "moved": moved}, indent=2))
+
 def build_parser():
     p = argparse.ArgumentParser(prog='omb-cli')
     sub = p.add_subparsers(dest='cmd', required=True)
@@ -59,9 +166,30 @@ def build_parser():
     p_exp.add_argument('--until', required=False)
     p_exp.set_defaults(func=cmd_export)
 
-    p_ver = sub.add_parser('verify', help='Verify a SUR or bundle JSON file')
+    p_all = sub.add_parser('export-all', help='Export signed bundles for every tenant in one store scan')
+    p_all.add_argument('--out', required=True, help='Output directory for per-tenant bundles and manifest.json')
+    p_all.add_argument('--since', required=False)
+    p_all.add_argument('--until', required=False)
+    p_all.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Parallel bundle signers')
+    p_all.set_defaults(func=cmd_export_all)
+
+    p_ing = sub.add_parser('ingest', help='Bulk record NDJSON usage events')
+    p_ing.add_argument('path', nargs='?', help="NDJSON file of usage events (default '-' for stdin)")
+    p_ing.add_argument('--batch-size', type=_positive_int, default=1000)
+    p_ing.add_argument('--workers', type=_positive_int, default=os.cpu_count() or 1, help='Signing threads per batch')
+    p_ing.add_argument('--output', choices=['surs', 'summary'], default='surs', help='Stream signed SURs as NDJSON (summary on stderr) or print only the summary')
+    p_ing.add_argument('--max-error-samples', type=int, default=20)
+    p_ing.set_defaults(func=cmd_ingest)
+
+    p_ver = sub.add_parser('verify', help='Verify a SUR, bundle or export manifest JSON file')
     p_ver.add_argument('path')
     p_ver.set_defaults(func=cmd_verify)
+
+    p_reb = sub.add_parser('rebalance', help='Move tenants between SQLite shards after changing shard count')
+    p_reb.add_argument('--path', required=False, help='Base SQLite path (default OMB_SQLITE_PATH)')
+    p_reb.add_argument('--from', dest='old_shards', required=True, type=int, help='Previous shard count (0 to migrate an unsharded OMB_STORE=sqlite file)')
+    p_reb.add_argument('--to', dest='new_shards', required=True, type=int)
+    p_reb.set_defaults(func=cmd_rebalance)
     return p
 
 def main(argv=None):  # pragma: no cover - tiny wrapper
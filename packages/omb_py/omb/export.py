@@ -1,14 +1,54 @@
 from __future__ import annotations
-import datetime, json
-from typing import List, Dict, Any
+import datetime, json, os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
 from .signing import canonical_json, sha256_cid
 from .meter import SignedUsageRecord
 
 CANONICAL_JSON_SEPARATORS = (',', ':')
 
-def bundle_for(records: List[SignedUsageRecord], tenant_id: str, signer) -> Dict[str, Any]:
+def bundle_for(records: List[SignedUsageRecord], tenant_id: str, signer, exported_at: Optional[str] = None) -> Dict[str, Any]:
     recs = [r.model_dump() for r in records]
-    body = {"records": recs, "tenant_id": tenant_id, "exported_at": datetime.datetime.now(datetime.timezone.utc).isoformat()}
+    body = {"records": recs, "tenant_id": tenant_id, "exported_at": exported_at or datetime.datetime.now(datetime.timezone.utc).isoformat()}
     cid = sha256_cid(canonical_json(body))
     sig = signer.sign(f"{cid}|{tenant_id}|{body['exported_at']}".encode('utf-8'))
     return body | {"cid": cid, "sig": sig, "kid": signer.kid}
+
+def partition_by_tenant(records: List[SignedUsageRecord]) -> Dict[str, List[SignedUsageRecord]]:
+    out: Dict[str, List[SignedUsageRecord]] = {}
+    for r in records:
+        out.setdefault(r.tenant_id, []).append(r)
+    return out
+
+BUNDLES_DIR = 'bundles'
+
+def bundle_filename(tenant_id: str) -> str:
+    """Manifest-relative path for a tenant's bundle.
+
+    Named by sha256(tenant_id) so any tenant id (``manifest``, very long, differing
+    only by case) maps to a safe, unique file; the readable id lives in the manifest.
+    """
+    return f"{BUNDLES_DIR}/{sha256_cid(tenant_id.encode('utf-8')).split(':', 1)[1]}.json"
+
+def export_all(meter, signer, out_dir: str, since_iso: Optional[str] = None, until_iso: Optional[str] = None, workers: int = 1) -> Dict[str, Any]:
+    """Export every tenant from one store scan into ``out_dir/bundles`` plus a signed ``manifest.json``."""
+    exported_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    parts = partition_by_tenant(meter.list_all(since_iso, until_iso))
+    os.makedirs(os.path.join(out_dir, BUNDLES_DIR), exist_ok=True)
+
+    def _write(tenant_id: str) -> Dict[str, Any]:
+        bundle = bundle_for(parts[tenant_id], tenant_id, signer, exported_at)
+        name = bundle_filename(tenant_id)
+        with open(os.path.join(out_dir, name), 'w', encoding='utf-8') as f:
+            json.dump(bundle, f, indent=2)
+        return {"tenant_id": tenant_id, "file": name, "records": len(bundle["records"]), "cid": bundle["cid"]}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        entries = list(pool.map(_write, sorted(parts)))
+    body = {"bundles": entries, "exported_at": exported_at, "since": since_iso, "until": until_iso}
+    cid = sha256_cid(canonical_json(body))
+    sig = signer.sign(f"{cid}|{exported_at}".encode('utf-8'))
+    manifest = body | {"cid": cid, "sig": sig, "kid": signer.kid}
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
@@ -1,7 +1,8 @@
 from __future__ import annotations
-import os, json, datetime, hashlib, sqlite3, logging
+import os, json, datetime, hashlib, sqlite3, logging, threading, glob
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Optional, List, Iterable, Any
+from typing import Optional, List, Iterable, Any, Dict
 from pydantic import BaseModel, Field, ConfigDict, validator
 from .signing import canonical_json, sha256_cid, b64u
 
@@ -35,6 +36,41 @@ class SignedUsageRecord(BaseModel):
             raise ValueError('cid must start with sha256:')
         return v
 
+class BatchPersistError(Exception):
+    """A ``record_many`` batch was only partly persisted.
+
+    ``committed`` holds the SURs that are durably stored and ``committed_index``
+    their positions in the input batch; everything else was not written.
+    """
+
+    def __init__(self, message: str, committed: List[SignedUsageRecord], committed_index: List[int]):
+        super().__init__(message)
+        self.committed = committed
+        self.committed_index = committed_index
+
+def _sign_usage(signer: Any, usage: UsageIn) -> Dict[str, Any]:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    ts = usage.ts or now.isoformat()
+    body = {
+        "tenant_id": usage.tenant_id,
+        "subject": usage.subject,
+        "action": usage.action,
+        "quantity": usage.quantity,
+        "ts": ts,
+    }
+    if usage.meta is not None:
+        body["meta"] = usage.meta
+    cid = sha256_cid(canonical_json(body))
+    msg = f"{cid}|{usage.tenant_id}|{ts}".encode("utf-8")
+    sig = signer.sign(msg)
+    return {"cid": cid, **body, "sur_sig": sig, "kid": signer.kid}
+
+def _sign_many(signer: Any, usages: List[UsageIn], workers: int = 1) -> List[Dict[str, Any]]:
+    if workers <= 1 or len(usages) < 2:
+        return [_sign_usage(signer, u) for u in usages]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda u: _sign_usage(signer, u), usages))
+
 # --- JSONL backend ---
 
 @dataclass
@@ -43,29 +79,41 @@ class JSONLMeter:
     path: str = "usage.jsonl"
 
     def record(self, usage: UsageIn) -> SignedUsageRecord:
-        now = datetime.datetime.now(datetime.timezone.utc)
-        ts = usage.ts or now.isoformat()
-        body = {
-            "tenant_id": usage.tenant_id,
-            "subject": usage.subject,
-            "action": usage.action,
-            "quantity": usage.quantity,
-            "ts": ts,
-        }
-        if usage.meta is not None:
-            body["meta"] = usage.meta
-        cid = sha256_cid(canonical_json(body))
-        msg = f"{cid}|{usage.tenant_id}|{ts}".encode("utf-8")
-        sig = self.signer.sign(msg)
-        sur = {"cid": cid, **body, "sur_sig": sig, "kid": self.signer.kid}
+        sur = _sign_usage(self.signer, usage)
         try:
-            with open(self.path, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(sur, separators=CANONICAL_JSON_SEPARATORS, sort_keys=True) + '\n')
+            self._append([sur])
         except Exception as e:  # pragma: no cover - disk errors rare
             log.warning("persistence failure: %s", e)
         return SignedUsageRecord(**sur)
 
+    def record_many(self, usages: List[UsageIn], workers: int = 1) -> List[SignedUsageRecord]:
+        """Sign and append a batch; unlike ``record``, persistence errors propagate."""
+        surs = _sign_many(self.signer, usages, workers)
+        self._append(surs)
+        return [SignedUsageRecord(**sur) for sur in surs]
+
+    def _append(self, surs: List[Dict[str, Any]]) -> None:
+        if not surs:
+            return
+        lines = ''.join(json.dumps(sur, separators=CANONICAL_JSON_SEPARATORS, sort_keys=True) + '\n' for sur in surs)
+        with open(self.path, 'ab') as f:
+            start = f.tell()
+            try:
+                f.write(lines.encode('utf-8'))
+                f.flush()
+            except Exception:
+                # all-or-nothing: drop a short write so no partial batch stays on disk
+                f.truncate(start)
+                raise
+
     def list_for_tenant(self, tenant_id: str, since_iso: Optional[str] = None, until_iso: Optional[str] = None) -> List[SignedUsageRecord]:
+        return self._scan(tenant_id, since_iso, until_iso)
+
+    def list_all(self, since_iso: Optional[str] = None, until_iso: Optional[str] = None) -> List[SignedUsageRecord]:
+        """Single pass over the log returning every tenant's records in file order."""
+        return self._scan(None, since_iso, until_iso)
+
+    def _scan(self, tenant_id: Optional[str], since_iso: Optional[str], until_iso: Optional[str]) -> List[SignedUsageRecord]:
         out: List[SignedUsageRecord] = []
         try:
             with open(self.path, 'r', encoding='utf-8') as f:
@@ -78,7 +126,7 @@ class JSONLMeter:
                     except Exception:
                         log.debug("skip malformed json line")
                         continue
-                    if data.get('tenant_id') != tenant_id:
+                    if tenant_id is not None and data.get('tenant_id') != tenant_id:
                         continue
                     ts = data.get('ts')
                     if since_iso and ts < since_iso:
@@ -111,58 +159,206 @@ class SQLiteMeter:
             conn.close()
 
     def record(self, usage: UsageIn) -> SignedUsageRecord:
-        now = datetime.datetime.now(datetime.timezone.utc)
-        ts = usage.ts or now.isoformat()
-        body = {
-            "tenant_id": usage.tenant_id,
-            "subject": usage.subject,
-            "action": usage.action,
-            "quantity": usage.quantity,
-            "ts": ts,
-        }
-        if usage.meta is not None:
-            body["meta"] = usage.meta
-        cid = sha256_cid(canonical_json(body))
-        msg = f"{cid}|{usage.tenant_id}|{ts}".encode("utf-8")
-        sig = self.signer.sign(msg)
-        sur = {"cid": cid, **body, "sur_sig": sig, "kid": self.signer.kid}
+        sur = _sign_usage(self.signer, usage)
+        self._append([sur])
+        return SignedUsageRecord(**sur)
+
+    def record_many(self, usages: List[UsageIn], workers: int = 1) -> List[SignedUsageRecord]:
+        surs = _sign_many(self.signer, usages, workers)
+        self._append(surs)
+        return [SignedUsageRecord(**sur) for sur in surs]
+
+    def _append(self, surs: List[Dict[str, Any]]) -> None:
+        if not surs:
+            return
         conn = sqlite3.connect(self.path)
         try:
-            conn.execute("INSERT INTO usage VALUES (?,?,?,?,?,?,?,?,?)", (
-                usage.tenant_id, usage.subject, usage.action, usage.quantity, ts, json.dumps(usage.meta) if usage.meta is not None else None, cid, sig, self.signer.kid
-            ))
-            conn.commit()
+            with conn:  # single transaction per batch
+                conn.executemany("INSERT INTO usage VALUES (?,?,?,?,?,?,?,?,?)", [(
+                    sur["tenant_id"], sur["subject"], sur["action"], sur["quantity"], sur["ts"], json.dumps(sur["meta"]) if "meta" in sur else None, sur["cid"], sur["sur_sig"], sur["kid"]
+                ) for sur in surs])
         finally:
             conn.close()
-        return SignedUsageRecord(**sur)
 
     def list_for_tenant(self, tenant_id: str, since_iso: Optional[str] = None, until_iso: Optional[str] = None) -> List[SignedUsageRecord]:
+        return self._query(tenant_id, since_iso, until_iso)
+
+    def list_all(self, since_iso: Optional[str] = None, until_iso: Optional[str] = None) -> List[SignedUsageRecord]:
+        return self._query(None, since_iso, until_iso)
+
+    def _query(self, tenant_id: Optional[str], since_iso: Optional[str], until_iso: Optional[str]) -> List[SignedUsageRecord]:
         conn = sqlite3.connect(self.path)
         try:
-            q = "SELECT cid, tenant_id, subject, action, quantity, ts, meta, sur_sig, kid FROM usage WHERE tenant_id=?"
-            params: list[Any] = [tenant_id]
+            q = "SELECT cid, tenant_id, subject, action, quantity, ts, meta, sur_sig, kid FROM usage WHERE 1=1"
+            params: list[Any] = []
+            if tenant_id is not None:
+                q += " AND tenant_id=?"
+                params.append(tenant_id)
             if since_iso:
                 q += " AND ts>=?"
                 params.append(since_iso)
             if until_iso:
                 q += " AND ts<=?"
                 params.append(until_iso)
-            q += " ORDER BY ts"
-            out: List[SignedUsageRecord] = []
-            for row in conn.execute(q, params):
-                meta_raw = row[6]
-                meta = json.loads(meta_raw) if meta_raw else None
-                out.append(SignedUsageRecord(
-                    cid=row[0], tenant_id=row[1], subject=row[2], action=row[3], quantity=row[4], ts=row[5], meta=meta, sur_sig=row[7], kid=row[8]
-                ))
-            return out
+            q += " ORDER BY tenant_id, ts"
+            return [_row_to_sur(row) for row in conn.execute(q, params)]
+        finally:
+            conn.close()
+
+def _row_to_sur(row: Any) -> SignedUsageRecord:
+    meta_raw = row[6]
+    meta = json.loads(meta_raw) if meta_raw else None
+    return SignedUsageRecord(
+        cid=row[0], tenant_id=row[1], subject=row[2], action=row[3], quantity=row[4], ts=row[5], meta=meta, sur_sig=row[7], kid=row[8]
+    )
+
+# --- Sharded SQLite backend ---
+# SQLite allows a single writer per database file, so tenants are spread over
+# N files by a jump consistent hash of tenant_id. A tenant always lives in
+# exactly one shard; cross-tenant scans fan out over all shards.
+
+def shard_for_tenant(tenant_id: str, shards: int) -> int:
+    """Jump consistent hash (Lamping & Veach) keyed by sha256(tenant_id)."""
+    if shards < 1:
+        raise ValueError("shards must be >= 1")
+    key = int.from_bytes(hashlib.sha256(tenant_id.encode("utf-8")).digest()[:8], "big")
+    b, j = -1, 0
+    while j < shards:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+def shard_path(path: str, index: int) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}.{index}{ext}"
+
+class ShardedSQLiteMeter:
+    def __init__(self, signer: Any, path: str = "usage.sqlite", shards: int = 4):
+        if shards < 1:
+            raise ValueError("shards must be >= 1")
+        self.signer = signer
+        self.path = path
+        self.shards = [SQLiteMeter(signer, shard_path(path, i)) for i in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+
+    def _index(self, tenant_id: str) -> int:
+        return shard_for_tenant(tenant_id, len(self.shards))
+
+    def record(self, usage: UsageIn) -> SignedUsageRecord:
+        sur = _sign_usage(self.signer, usage)
+        i = self._index(usage.tenant_id)
+        with self._locks[i]:  # one writer per shard
+            self.shards[i]._append([sur])
+        return SignedUsageRecord(**sur)
+
+    def record_many(self, usages: List[UsageIn], workers: int = 1) -> List[SignedUsageRecord]:
+        """Sign a batch and write each shard's part in its own transaction.
+
+        If some shards fail, the others stay committed and ``BatchPersistError``
+        reports exactly which SURs were stored.
+        """
+        surs = _sign_many(self.signer, usages, workers)
+        shard_of = [self._index(sur["tenant_id"]) for sur in surs]
+        by_shard: Dict[int, List[Dict[str, Any]]] = {}
+        for i, sur in zip(shard_of, surs):
+            by_shard.setdefault(i, []).append(sur)
+
+        def _write(i: int) -> None:
+            with self._locks[i]:
+                self.shards[i]._append(by_shard[i])
+
+        failed: Dict[int, BaseException] = {}
+        if by_shard:
+            with ThreadPoolExecutor(max_workers=len(by_shard)) as pool:
+                futures = {i: pool.submit(_write, i) for i in by_shard}
+            for i, fut in futures.items():
+                exc = fut.exception()
+                if exc is not None:
+                    failed[i] = exc
+        if failed:
+            index = [k for k, i in enumerate(shard_of) if i not in failed]
+            cause = next(iter(failed.values()))
+            raise BatchPersistError(
+                f"{len(failed)} of {len(by_shard)} shard writes failed: {cause}",
+                [SignedUsageRecord(**surs[k]) for k in index], index,
+            ) from cause
+        return [SignedUsageRecord(**sur) for sur in surs]
+
+    def list_for_tenant(self, tenant_id: str, since_iso: Optional[str] = None, until_iso: Optional[str] = None) -> List[SignedUsageRecord]:
+        return self.shards[self._index(tenant_id)].list_for_tenant(tenant_id, since_iso, until_iso)
+
+    def list_all(self, since_iso: Optional[str] = None, until_iso: Optional[str] = None) -> List[SignedUsageRecord]:
+        with ThreadPoolExecutor(max_workers=len(self.shards)) as pool:
+            parts = list(pool.map(lambda s: s.list_all(since_iso, until_iso), self.shards))
+        return [r for part in parts for r in part]
+
+def _existing_shards(path: str) -> List[int]:
+    root, ext = os.path.splitext(path)
+    found = []
+    for p in glob.glob(glob.escape(root) + ".*" + glob.escape(ext)):
+        index = p[len(root) + 1:len(p) - len(ext)]
+        if index.isdigit():
+            found.append(int(index))
+    return sorted(found)
+
+def rebalance_shards(path: str, old_shards: int, new_shards: int) -> int:
+    """Move tenants between shard files after a shard-count change.
+
+    ``old_shards=0`` migrates an unsharded ``OMB_STORE=sqlite`` file at ``path``
+    into the shards. Every existing shard file is scanned, not just the first
+    ``old_shards``, so an understated count cannot strand tenants. Each tenant is
+    copied and deleted in one transaction spanning both files, so an interrupted
+    run never leaves a tenant duplicated or missing. Returns the number of rows
+    moved. Source files that end up unused are left empty on disk.
+
+    Stop every writer (or restart it pinned to ``new_shards``) before running:
+    a process still routing by the old count would write into shards that were
+    already drained. Each source file is held under an exclusive lock while it
+    is drained, so stragglers get ``database is locked`` instead of reading a
+    half-moved tenant, but the lock cannot cover files drained earlier in the run.
+    """
+    if old_shards < 0:
+        raise ValueError("old shard count must be >= 0 (0 = unsharded store)")
+    if new_shards < 1:
+        raise ValueError("new shard count must be >= 1")
+    for i in range(new_shards):
+        SQLiteMeter(None, shard_path(path, i))
+    sources: List[tuple[Optional[int], str]] = [(i, shard_path(path, i)) for i in sorted(set(range(old_shards)) | set(_existing_shards(path)))]
+    if old_shards == 0 and os.path.exists(path):
+        sources.insert(0, (None, path))
+    moved = 0
+    for src, src_path in sources:
+        if not os.path.exists(src_path):
+            continue
+        conn = sqlite3.connect(src_path)
+        try:
+            conn.execute("PRAGMA main.locking_mode=EXCLUSIVE")  # lock is kept until close
+            conn.execute("BEGIN EXCLUSIVE")
+            conn.commit()
+            tenants = [row[0] for row in conn.execute("SELECT DISTINCT tenant_id FROM usage")]
+            for tenant_id in tenants:
+                dst = shard_for_tenant(tenant_id, new_shards)
+                if dst == src:
+                    continue
+                conn.execute("ATTACH DATABASE ? AS dst", (shard_path(path, dst),))
+                try:
+                    with conn:
+                        cur = conn.execute("INSERT INTO dst.usage SELECT * FROM main.usage WHERE tenant_id=?", (tenant_id,))
+                        conn.execute("DELETE FROM main.usage WHERE tenant_id=?", (tenant_id,))
+                        moved += cur.rowcount
+                finally:
+                    conn.execute("DETACH DATABASE dst")
         finally:
             conn.close()
+    return moved
 
 # --- factory ---
 
 def meter_for_env(signer: Any):
     backend = os.getenv("OMB_STORE", "jsonl").lower()
+    if backend == "sqlite-sharded":
+        return ShardedSQLiteMeter(signer, os.getenv("OMB_SQLITE_PATH", "usage.sqlite"), int(os.getenv("OMB_SQLITE_SHARDS", "4")))
     if backend == "sqlite":
         return SQLiteMeter(signer, os.getenv("OMB_SQLITE_PATH", "usage.sqlite"))
     return JSONLMeter(signer, os.getenv("OMB_LOCAL_SUR_PATH", "usage.jsonl"))
@@ -1,5 +1,6 @@
 from __future__ import annotations
-from typing import Dict, Any
+import json, os
+from typing import Dict, Any, Optional
 from .signing import canonical_json, sha256_cid, verify as verify_sig
 
 def verify_sur(sur: Dict[str, Any]) -> bool:
@@ -24,3 +25,37 @@ def verify_bundle(bundle: Dict[str, Any]) -> bool:
         return False
     msg = f"{cid}|{body['tenant_id']}|{body['exported_at']}".encode('utf-8')
     return verify_sig(bundle.get("kid", ""), msg, bundle.get("sig", ""))
+
+def _verify_manifest_entry(entry: Dict[str, Any], base_dir: str, exported_at: Any) -> bool:
+    rel = entry.get("file")
+    if not isinstance(rel, str) or os.path.isabs(rel) or os.path.normpath(rel).startswith(os.pardir):
+        return False
+    try:
+        with open(os.path.join(base_dir, rel), 'r', encoding='utf-8') as f:
+            bundle = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if not isinstance(bundle, dict) or not verify_bundle(bundle):
+        return False
+    return (
+        bundle.get("cid") == entry.get("cid")
+        and bundle.get("tenant_id") == entry.get("tenant_id")
+        and bundle.get("exported_at") == exported_at
+        and len(bundle["records"]) == entry.get("records")
+    )
+
+def verify_manifest(manifest: Dict[str, Any], base_dir: Optional[str] = None) -> bool:
+    """Verify an export-all manifest; with ``base_dir`` also verify every listed bundle file."""
+    entries = manifest.get("bundles")
+    if not isinstance(entries, list):
+        return False
+    body = {"bundles": entries, "exported_at": manifest.get("exported_at"), "since": manifest.get("since"), "until": manifest.get("until")}
+    cid = sha256_cid(canonical_json(body))
+    if cid != manifest.get("cid"):
+        return False
+    msg = f"{cid}|{body['exported_at']}".encode('utf-8')
+    if not verify_sig(manifest.get("kid", ""), msg, manifest.get("sig", "")):
+        return False
+    if base_dir is None:
+        return True
+    return all(isinstance(e, dict) and _verify_manifest_entry(e, base_dir, body["exported_at"]) for e in entries)
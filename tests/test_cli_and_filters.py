@@ -60,3 +60,190 @@ def test_since_until_filters_jsonl(tmp_path):
     assert len(recs) == 2
     recs2 = meter.list_for_tenant('t1', until_iso=now.isoformat())
     assert len(recs2) == 2
+
+
+def test_record_many_jsonl_and_sqlite(tmp_path):
+    from omb.meter import SQLiteMeter
+    signer = Ed25519Signer(priv_b64=PRIV, kid=KID)
+    usages = [UsageIn(tenant_id=f't{i % 3}', subject='s', action='a', quantity=i + 1) for i in range(10)]
+    for meter in (JSONLMeter(signer, path=tmp_path / 'usage.jsonl'), SQLiteMeter(signer, str(tmp_path / 'usage.sqlite'))):
+        surs = meter.record_many(usages, workers=4)
+        assert [s.quantity for s in surs] == list(range(1, 11))
+        assert all(signer.verify(f"{s.cid}|{s.tenant_id}|{s.ts}".encode(), s.sur_sig) for s in surs)
+        assert len(meter.list_for_tenant('t0')) == 4
+
+def test_cli_ingest(tmp_path):
+    env = os.environ.copy()
+    env['OMB_PRIVATE_KEY_B64'] = PRIV
+    env['OMB_KID'] = KID
+    env['OMB_LOCAL_SUR_PATH'] = str(tmp_path / 'usage.jsonl')
+    lines = [json.dumps({'tenant_id': 't1', 'subject': 's', 'action': 'a', 'quantity': i + 1}) for i in range(5)]
+    lines += ['{bad json}', json.dumps({'tenant_id': 't1', 'subject': 's', 'action': 'a', 'quantity': 0}), '[1]', 'null', '']
+    proc = subprocess.run([sys.executable, '-m', 'omb.cli', 'ingest', '--batch-size', '2'], input='\n'.join(lines) + '\n', env=env, capture_output=True, text=True, check=True)
+    surs = [json.loads(l) for l in proc.stdout.splitlines()]
+    assert [s['quantity'] for s in surs] == [1, 2, 3, 4, 5]
+    summary = json.loads(proc.stderr)
+    assert summary['recorded'] == 5
+    assert summary['invalid_json'] == 1 and summary['invalid_usage'] == 3
+    assert [e['line'] for e in summary['error_samples']] == [6, 7, 8, 9]
+    assert summary['error_samples'][2]['error'] == 'not a JSON object'
+    assert summary['error_samples'][1]['error'] == 'quantity: Input should be greater than 0'
+    assert summary['last_committed_line'] == 10 and summary['persist_error'] is None
+    out = subprocess.check_output([sys.executable, '-m', 'omb.cli', 'export', '--tenant', 't1'], env=env, text=True)
+    assert len(json.loads(out)['records']) == 5
+
+def test_cli_ingest_summary_from_file(tmp_path):
+    env = os.environ.copy()
+    env['OMB_PRIVATE_KEY_B64'] = PRIV
+    env['OMB_KID'] = KID
+    env['OMB_STORE'] = 'sqlite'
+    env['OMB_SQLITE_PATH'] = str(tmp_path / 'usage.sqlite')
+    src = tmp_path / 'events.ndjson'
+    src.write_text(''.join(json.dumps({'tenant_id': 't2', 'subject': 's', 'action': 'a', 'quantity': 1}) + '\n' for _ in range(3)))
+    out = subprocess.check_output([sys.executable, '-m', 'omb.cli', 'ingest', str(src), '--output', 'summary'], env=env, text=True)
+    summary = json.loads(out)
+    assert summary['recorded'] == 3 and summary['errors'] == 0
+
+
+def test_cli_export_all(tmp_path):
+    env = os.environ.copy()
+    env['OMB_PRIVATE_KEY_B64'] = PRIV
+    env['OMB_KID'] = KID
+    env['OMB_STORE'] = 'sqlite-sharded'
+    env['OMB_SQLITE_PATH'] = str(tmp_path / 'usage.sqlite')
+    env['OMB_SQLITE_SHARDS'] = '2'
+    for t in ('t1', 't2', 't3'):
+        subprocess.check_call([sys.executable, '-m', 'omb.cli', 'record', '--tenant', t, '--subject', 's', '--action', 'a', '--quantity', '1'], env=env)
+    out_dir = tmp_path / 'out'
+    out = subprocess.check_output([sys.executable, '-m', 'omb.cli', 'export-all', '--out', str(out_dir)], env=env, text=True)
+    manifest = json.loads(out)
+    assert [e['tenant_id'] for e in manifest['bundles']] == ['t1', 't2', 't3']
+    assert sorted(p.name for p in out_dir.iterdir()) == ['bundles', 'manifest.json']
+    assert sorted(e['file'] for e in manifest['bundles']) == sorted('bundles/' + p.name for p in (out_dir / 'bundles').iterdir())
+
+def test_cli_verify_manifest(tmp_path):
+    env = os.environ.copy()
+    env['OMB_PRIVATE_KEY_B64'] = PRIV
+    env['OMB_KID'] = Ed25519Signer(priv_b64=PRIV, kid=KID).public_key_b64  # verifiers resolve kid as the public key
+    env['OMB_LOCAL_SUR_PATH'] = str(tmp_path / 'usage.jsonl')
+    for t in ('t1', 't2'):
+        subprocess.check_call([sys.executable, '-m', 'omb.cli', 'record', '--tenant', t, '--subject', 's', '--action', 'a', '--quantity', '1', '--meta', '{"src": "test"}'], env=env)
+    out_dir = tmp_path / 'out'
+    manifest = json.loads(subprocess.check_output([sys.executable, '-m', 'omb.cli', 'export-all', '--out', str(out_dir)], env=env, text=True))
+    proc = subprocess.run([sys.executable, '-m', 'omb.cli', 'verify', str(out_dir / 'manifest.json')], env=env, capture_output=True, text=True)
+    assert proc.returncode == 0 and proc.stdout.strip() == 'OK'
+    target = out_dir / manifest['bundles'][0]['file']
+    bundle = json.loads(target.read_text())
+    bundle['records'][0]['quantity'] = 999
+    target.write_text(json.dumps(bundle))
+    proc = subprocess.run([sys.executable, '-m', 'omb.cli', 'verify', str(out_dir / 'manifest.json')], env=env, capture_output=True, text=True)
+    assert proc.returncode == 1 and proc.stdout.strip() == 'FAIL'
+
+
+def test_cli_ingest_caps_error_samples(tmp_path):
+    env = os.environ.copy()
+    env['OMB_PRIVATE_KEY_B64'] = PRIV
+    env['OMB_KID'] = KID
+    env['OMB_LOCAL_SUR_PATH'] = str(tmp_path / 'usage.jsonl')
+    proc = subprocess.run([sys.executable, '-m', 'omb.cli', 'ingest', '--output', 'summary', '--max-error-samples', '3'], input='{bad}\n' * 50, env=env, capture_output=True, text=True, check=True)
+    summary = json.loads(proc.stdout)
+    assert summary['invalid_json'] == 50
+    assert [e['line'] for e in summary['error_samples']] == [1, 2, 3]
+
+def test_cli_ingest_persist_failure(tmp_path, monkeypatch, capsys):
+    import io
+    from omb import cli
+    monkeypatch.setenv('OMB_PRIVATE_KEY_B64', PRIV)
+    monkeypatch.setenv('OMB_KID', KID)
+    monkeypatch.setenv('OMB_STORE', 'jsonl')
+    monkeypatch.setenv('OMB_LOCAL_SUR_PATH', str(tmp_path / 'usage.jsonl'))
+    real_append = JSONLMeter._append
+    calls = []
+    def flaky_append(self, surs):
+        calls.append(len(surs))
+        if len(calls) == 2:
+            raise OSError('disk full')
+        real_append(self, surs)
+    monkeypatch.setattr(JSONLMeter, '_append', flaky_append)
+    lines = ''.join(json.dumps({'tenant_id': 't1', 'subject': 's', 'action': 'a', 'quantity': i + 1}) + '\n' for i in range(6))
+    monkeypatch.setattr(sys, 'stdin', io.StringIO(lines))
+    with pytest.raises(SystemExit) as exc:
+        cli.main(['ingest', '--batch-size', '2'])
+    assert exc.value.code == 1
+    captured = capsys.readouterr()
+    assert [json.loads(l)['quantity'] for l in captured.out.splitlines()] == [1, 2]
+    summary = json.loads(captured.err)
+    assert summary['recorded'] == 2 and summary['last_committed_line'] == 2
+    assert summary['persist_error'] == {'first_line': 3, 'last_line': 4, 'uncommitted_lines': [3, 4], 'error': 'disk full'}
+    assert len(JSONLMeter(None, path=tmp_path / 'usage.jsonl').list_for_tenant('t1')) == 2
+
+
+def test_cli_ingest_sharded_partial_commit(tmp_path, monkeypatch, capsys):
+    import io, sqlite3
+    from omb import cli
+    from omb.meter import SQLiteMeter, ShardedSQLiteMeter, shard_for_tenant, shard_path
+    base = str(tmp_path / 'usage.sqlite')
+    monkeypatch.setenv('OMB_PRIVATE_KEY_B64', PRIV)
+    monkeypatch.setenv('OMB_KID', KID)
+    monkeypatch.setenv('OMB_STORE', 'sqlite-sharded')
+    monkeypatch.setenv('OMB_SQLITE_PATH', base)
+    monkeypatch.setenv('OMB_SQLITE_SHARDS', '2')
+    t0 = next(f't{i}' for i in range(100) if shard_for_tenant(f't{i}', 2) == 0)
+    t1 = next(f't{i}' for i in range(100) if shard_for_tenant(f't{i}', 2) == 1)
+    real_append = SQLiteMeter._append
+    def locked_shard_1(self, surs):
+        if self.path == shard_path(base, 1):
+            raise sqlite3.OperationalError('database is locked')
+        real_append(self, surs)
+    monkeypatch.setattr(SQLiteMeter, '_append', locked_shard_1)
+    tenants = [t0, t1, t0, t1]
+    lines = ''.join(json.dumps({'tenant_id': t, 'subject': 's', 'action': 'a', 'quantity': i + 1}) + '\n' for i, t in enumerate(tenants))
+    monkeypatch.setattr(sys, 'stdin', io.StringIO(lines))
+    with pytest.raises(SystemExit) as exc:
+        cli.main(['ingest', '--batch-size', '10'])
+    assert exc.value.code == 1
+    captured = capsys.readouterr()
+    streamed = [json.loads(l) for l in captured.out.splitlines()]
+    assert [(s['tenant_id'], s['quantity']) for s in streamed] == [(t0, 1), (t0, 3)]
+    summary = json.loads(captured.err)
+    assert summary['recorded'] == 2 and summary['last_committed_line'] == 0
+    assert summary['persist_error']['uncommitted_lines'] == [2, 4]
+    assert 'database is locked' in summary['persist_error']['error']
+    stored = ShardedSQLiteMeter(None, base, shards=2).list_all()
+    assert sorted(r.cid for r in stored) == sorted(s['cid'] for s in streamed)
+
+def test_record_many_jsonl_short_write_is_dropped(tmp_path, monkeypatch):
+    import builtins
+    signer = Ed25519Signer(priv_b64=PRIV, kid=KID)
+    path = tmp_path / 'usage.jsonl'
+    meter = JSONLMeter(signer, path=path)
+    meter.record(UsageIn(tenant_id='t1', subject='s', action='a', quantity=1))
+    real_open = builtins.open
+    class ShortWrite:
+        def __init__(self, f):
+            self._f = f
+        def __enter__(self):
+            return self
+        def __exit__(self, *exc):
+            self._f.close()
+        def __getattr__(self, name):
+            return getattr(self._f, name)
+        def write(self, data):
+            self._f.write(data[:len(data) // 2])
+            self._f.flush()
+            raise OSError('disk full')
+    monkeypatch.setattr(builtins, 'open', lambda *a, **k: ShortWrite(real_open(*a, **k)) if 'ab' in a else real_open(*a, **k))
+    with pytest.raises(OSError):
+        meter.record_many([UsageIn(tenant_id='t1', subject='s', action='a', quantity=q) for q in (2, 3, 4)])
+    monkeypatch.setattr(builtins, 'open', real_open)
+    assert [r.quantity for r in meter.list_for_tenant('t1')] == [1]
+    assert len(path.read_text().splitlines()) == 1
+
+
+@pytest.mark.parametrize('flag', ['--batch-size', '--workers'])
+@pytest.mark.parametrize('value', ['0', '-3'])
+def test_cli_ingest_rejects_non_positive(flag, value):
+    from omb.cli import build_parser
+    with pytest.raises(SystemExit) as exc:
+        build_parser().parse_args(['ingest', flag, value])
+    assert exc.value.code == 2
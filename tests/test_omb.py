@@ -39,3 +39,48 @@ def test_time_filters(tmp_path):
     assert len(res) == 2
     res2 = meter.list_for_tenant('t1', until_iso=now.isoformat())
     assert len(res2) == 2
+
+
+def test_export_all_single_pass(tmp_path):
+    from omb.export import export_all, bundle_filename
+    signer = Ed25519Signer(priv_b64=PRIV, kid=KID)
+    meter = JSONLMeter(signer, path=tmp_path / 'usage.jsonl')
+    tenants = ['t1', 'T1', 'a/b', 'manifest', 'x' * 300]
+    for i in range(10):
+        meter.record(UsageIn(tenant_id=tenants[i % 5], subject='s', action='a', quantity=i + 1))
+    out = tmp_path / 'out'
+    manifest = export_all(meter, signer, str(out), workers=3)
+    assert [e['tenant_id'] for e in manifest['bundles']] == sorted(tenants)
+    assert len({e['file'] for e in manifest['bundles']}) == 5
+    for entry in manifest['bundles']:
+        assert entry['file'] == bundle_filename(entry['tenant_id'])
+        assert entry['file'].startswith('bundles/')
+        bundle = json.loads((out / entry['file']).read_text())
+        assert bundle['tenant_id'] == entry['tenant_id']
+        assert bundle['exported_at'] == manifest['exported_at']
+        assert bundle['cid'] == entry['cid'] and entry['records'] == 2
+        expected = [r.model_dump() for r in meter.list_for_tenant(entry['tenant_id'])]
+        assert bundle['records'] == expected
+    assert json.loads((out / 'manifest.json').read_text()) == manifest
+
+def test_verify_manifest_roundtrip(tmp_path):
+    from omb.export import export_all
+    from omb.verify import verify_manifest
+    pub = Ed25519Signer(priv_b64=PRIV, kid=KID).public_key_b64
+    signer = Ed25519Signer(priv_b64=PRIV, kid=pub)  # verifiers resolve kid as the public key
+    meter = JSONLMeter(signer, path=tmp_path / 'usage.jsonl')
+    for t in ('t1', 't2', 'manifest'):
+        meter.record(UsageIn(tenant_id=t, subject='s', action='a', quantity=1, meta={'src': 'test'}))
+    out = tmp_path / 'out'
+    manifest = export_all(meter, signer, str(out))
+    assert verify_manifest(manifest)
+    assert verify_manifest(manifest, base_dir=str(out))
+    target = out / manifest['bundles'][0]['file']
+    bundle = json.loads(target.read_text())
+    bundle['records'][0]['quantity'] = 999
+    target.write_text(json.dumps(bundle))
+    assert verify_manifest(manifest)  # signature alone still holds
+    assert not verify_manifest(manifest, base_dir=str(out))
+    (out / manifest['bundles'][1]['file']).unlink()
+    target.write_text(json.dumps(json.loads(target.read_text()) | {'records': []}))
+    assert not verify_manifest(manifest, base_dir=str(out))
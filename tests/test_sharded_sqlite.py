@@ -0,0 +1,142 @@
+import os, json, subprocess, sys
+from omb.signing import Ed25519Signer
+from omb.meter import UsageIn, SQLiteMeter, ShardedSQLiteMeter, shard_for_tenant, shard_path, rebalance_shards, meter_for_env
+
+PRIV = 'AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA='
+KID = 'kid123'
+
+def test_shard_for_tenant_stable_and_in_range():
+    for n in (1, 2, 7):
+        for t in ('a', 'b', 'acme', 'tenant-42'):
+            i = shard_for_tenant(t, n)
+            assert 0 <= i < n
+            assert shard_for_tenant(t, n) == i
+    # growing the ring only ever moves a tenant onto the new shard
+    for k in range(200):
+        t = f't{k}'
+        before, after = shard_for_tenant(t, 4), shard_for_tenant(t, 5)
+        assert after in (before, 4)
+
+def test_sharded_record_and_list(tmp_path):
+    signer = Ed25519Signer(priv_b64=PRIV, kid=KID)
+    meter = ShardedSQLiteMeter(signer, str(tmp_path / 'usage.sqlite'), shards=3)
+    tenants = [f't{i}' for i in range(10)]
+    for t in tenants:
+        meter.record(UsageIn(tenant_id=t, subject='s', action='a', quantity=1))
+    for t in tenants:
+        recs = meter.list_for_tenant(t)
+        assert [r.tenant_id for r in recs] == [t]
+        shard = SQLiteMeter(signer, shard_path(str(tmp_path / 'usage.sqlite'), shard_for_tenant(t, 3)))
+        assert len(shard.list_for_tenant(t)) == 1
+    assert sorted(r.tenant_id for r in meter.list_all()) == sorted(tenants)
+
+def test_meter_for_env_sharded(tmp_path, monkeypatch):
+    monkeypatch.setenv('OMB_STORE', 'sqlite-sharded')
+    monkeypatch.setenv('OMB_SQLITE_PATH', str(tmp_path / 'usage.sqlite'))
+    monkeypatch.setenv('OMB_SQLITE_SHARDS', '2')
+    meter = meter_for_env(Ed25519Signer(priv_b64=PRIV, kid=KID))
+    assert isinstance(meter, ShardedSQLiteMeter)
+    assert len(meter.shards) == 2
+
+def test_rebalance_moves_tenants(tmp_path):
+    signer = Ed25519Signer(priv_b64=PRIV, kid=KID)
+    base = str(tmp_path / 'usage.sqlite')
+    old = ShardedSQLiteMeter(signer, base, shards=2)
+    tenants = [f't{i}' for i in range(20)]
+    for t in tenants:
+        old.record(UsageIn(tenant_id=t, subject='s', action='a', quantity=1))
+        old.record(UsageIn(tenant_id=t, subject='s', action='a', quantity=2))
+    expected = sum(1 for t in tenants if shard_for_tenant(t, 5) != shard_for_tenant(t, 2)) * 2
+    assert rebalance_shards(base, 2, 5) == expected
+    new = ShardedSQLiteMeter(signer, base, shards=5)
+    for t in tenants:
+        assert len(new.list_for_tenant(t)) == 2
+    assert len(new.list_all()) == 40
+
+def test_cli_rebalance(tmp_path):
+    env = os.environ.copy()
+    env['OMB_PRIVATE_KEY_B64'] = PRIV
+    env['OMB_KID'] = KID
+    env['OMB_STORE'] = 'sqlite-sharded'
+    env['OMB_SQLITE_PATH'] = str(tmp_path / 'usage.sqlite')
+    env['OMB_SQLITE_SHARDS'] = '1'
+    for t in ('t1', 't2', 't3'):
+        subprocess.check_call([sys.executable, '-m', 'omb.cli', 'record', '--tenant', t, '--subject', 's', '--action', 'a', '--quantity', '1'], env=env)
+    out = subprocess.check_output([sys.executable, '-m', 'omb.cli', 'rebalance', '--from', '1', '--to', '3'], env=env, text=True)
+    assert json.loads(out)['to'] == 3
+    env['OMB_SQLITE_SHARDS'] = '3'
+    for t in ('t1', 't2', 't3'):
+        data = json.loads(subprocess.check_output([sys.executable, '-m', 'omb.cli', 'export', '--tenant', t], env=env, text=True))
+        assert len(data['records']) == 1
+
+
+def test_sharded_record_many(tmp_path):
+    signer = Ed25519Signer(priv_b64=PRIV, kid=KID)
+    meter = ShardedSQLiteMeter(signer, str(tmp_path / 'usage.sqlite'), shards=3)
+    usages = [UsageIn(tenant_id=f't{i % 5}', subject='s', action='a', quantity=i + 1) for i in range(25)]
+    surs = meter.record_many(usages, workers=4)
+    assert [s.quantity for s in surs] == list(range(1, 26))
+    for t in range(5):
+        assert len(meter.list_for_tenant(f't{t}')) == 5
+
+
+def test_rebalance_scans_all_existing_shards(tmp_path):
+    signer = Ed25519Signer(priv_b64=PRIV, kid=KID)
+    base = str(tmp_path / 'usage.sqlite')
+    old = ShardedSQLiteMeter(signer, base, shards=4)
+    tenants = [f't{i}' for i in range(20)]
+    for t in tenants:
+        old.record(UsageIn(tenant_id=t, subject='s', action='a', quantity=1))
+    # understated --from: shards 2 and 3 must still be drained
+    rebalance_shards(base, 2, 3)
+    new = ShardedSQLiteMeter(signer, base, shards=3)
+    for t in tenants:
+        assert len(new.list_for_tenant(t)) == 1
+    assert SQLiteMeter(signer, shard_path(base, 3)).list_all() == []
+
+def test_rebalance_from_unsharded(tmp_path):
+    signer = Ed25519Signer(priv_b64=PRIV, kid=KID)
+    base = str(tmp_path / 'usage.sqlite')
+    flat = SQLiteMeter(signer, base)
+    tenants = [f't{i}' for i in range(10)]
+    for t in tenants:
+        flat.record(UsageIn(tenant_id=t, subject='s', action='a', quantity=1))
+    assert rebalance_shards(base, 0, 3) == 10
+    sharded = ShardedSQLiteMeter(signer, base, shards=3)
+    for t in tenants:
+        assert len(sharded.list_for_tenant(t)) == 1
+    assert flat.list_all() == []
+
+def test_cli_rebalance_rejects_zero_shards(tmp_path):
+    env = os.environ.copy()
+    env['OMB_SQLITE_PATH'] = str(tmp_path / 'usage.sqlite')
+    proc = subprocess.run([sys.executable, '-m', 'omb.cli', 'rebalance', '--from', '2', '--to', '0'], env=env, capture_output=True, text=True)
+    assert proc.returncode == 1
+    assert 'Traceback' not in proc.stderr
+    assert 'new shard count' in proc.stdout
+
+
+def test_rebalance_holds_source_lock(tmp_path, monkeypatch):
+    import sqlite3
+    signer = Ed25519Signer(priv_b64=PRIV, kid=KID)
+    base = str(tmp_path / 'usage.sqlite')
+    old = ShardedSQLiteMeter(signer, base, shards=1)
+    tenants = [f't{i}' for i in range(10)]
+    for t in tenants:
+        old.record(UsageIn(tenant_id=t, subject='s', action='a', quantity=1))
+    blocked = []
+    real_for_tenant = shard_for_tenant
+    def probe(tenant_id, shards):
+        # a straggler writing to the source mid-run must be refused
+        other = sqlite3.connect(shard_path(base, 0), timeout=0)
+        try:
+            other.execute("INSERT INTO usage (tenant_id) VALUES ('late')")
+            other.commit()
+        except sqlite3.OperationalError as e:
+            blocked.append(str(e))
+        finally:
+            other.close()
+        return real_for_tenant(tenant_id, shards)
+    monkeypatch.setattr('omb.meter.shard_for_tenant', probe)
+    rebalance_shards(base, 1, 2)
+    assert blocked and all('locked' in e for e in blocked)